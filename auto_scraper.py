@@ -1,19 +1,112 @@
+import atexit
 import csv
+import os
 from datetime import datetime
 import undetected_chromedriver as uc
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import time
 import re
 
+# URL query parameters on United's results page (f=ORIGIN, t=DESTINATION, d=DATE)
+_RE_ORIGIN = re.compile(r'f=([A-Z]{3})')
+_RE_DEST = re.compile(r't=([A-Z]{3})')
+_RE_DATE = re.compile(r'd=(\d{4}-\d{2}-\d{2})')
+_RE_NON_DIGITS = re.compile(r'\D+')
+
+# Flight card selectors, most specific first
+FLIGHT_SELECTORS = [
+    "[class*='flight-result'], [class*='FlightResult'], [data-qa*='flight']",
+    "[class*='flightCard'], [class*='flight-card']",
+    "li[class*='flight'], div[class*='flight']",
+]
+
+# Any flight card appearing means the results list has started rendering. The
+# catch-all li/div fallback also matches wrappers and loading skeletons, so
+# pages that only match it rely on the wait timing out instead.
+RESULTS_READY_SELECTOR = ", ".join(FLIGHT_SELECTORS[:2])
+
+# First flight card on the page, picked the same way JS_EXTRACT counts them
+JS_FIRST_FLIGHT_CARD = """
+for (const sel of arguments[0]) {
+    const card = document.querySelector(sel);
+    if (card) return card;
+}
+return null;
+"""
+
+# Blocked / no-flights banner checks shared by JS_EXTRACT and JS_BANNER_SHOWN
+JS_BANNERS = """
+const bodyText = document.body ? document.body.innerText : '';
+const blocked = bodyText.includes('unable to complete your request') || bodyText.includes('Please try again later');
+const noFlightsBanner = bodyText.includes('No flights') || bodyText.includes('no flights');
+const noFlights = noFlightsBanner || bodyText.includes('not available');
+"""
+
+# ...or United has answered with a blocked / "No flights" banner instead of
+# results. 'not available' is left out here: fare-calendar cells in the
+# results shell show it before any result renders.
+JS_BANNER_SHOWN = JS_BANNERS + """
+return blocked || noFlightsBanner;
+"""
+
+MILES_SELECTOR = "[class*='miles'], [class*='award-price'], [data-qa*='price']"
+
+# Reads everything extract_flight_data needs from the page in one WebDriver
+# round-trip: the URL, the blocked/no-flights banners, the flight card count
+# (first selector group that matches anything) and the miles texts. Nested
+# miles matches render the same text at the same position, so they are
+# collapsed to one entry; miles elements that are not rendered are skipped.
+JS_EXTRACT = JS_BANNERS + """
+const [flightSelectors, milesSelector] = arguments;
+
+let flightsFound = 0;
+for (const sel of flightSelectors) {
+    flightsFound = document.querySelectorAll(sel).length;
+    if (flightsFound) break;
+}
+
+const seen = new Set();
+const milesTexts = [];
+for (const e of document.querySelectorAll(milesSelector)) {
+    // Hidden elements (collapsed fares, tooltips) have no visible text
+    if (!e.getClientRects().length) continue;
+    const text = (e.innerText || '').trim();
+    const sig = e.getBoundingClientRect().top + ':' + text;
+    if (seen.has(sig)) continue;
+    seen.add(sig);
+    milesTexts.push(text);
+}
+
+return {
+    url: location.href,
+    blocked: blocked,
+    no_flights: noFlights,
+    flights_found: flightsFound,
+    miles_texts: milesTexts
+};
+"""
+
 def extract_flight_data(driver):
     """Extract flight data from the current United.com results page"""
     try:
         print("\n🔍 Detecting flight search parameters...")
 
-        # Extract origin, destination, and date from URL or page
-        current_url = driver.current_url
+        # Wait for flight results to render instead of sleeping a fixed time
+        try:
+            WebDriverWait(driver, 15).until(EC.any_of(
+                EC.presence_of_element_located((By.CSS_SELECTOR, RESULTS_READY_SELECTOR)),
+                lambda d: d.execute_script(JS_BANNER_SHOWN),
+            ))
+        except TimeoutException:
+            pass
+
+        page = driver.execute_script(JS_EXTRACT, FLIGHT_SELECTORS, MILES_SELECTOR)
+
+        # Extract origin, destination, and date from URL
+        current_url = page['url']
 
         # Parse URL parameters
         origin = None
@@ -22,29 +115,25 @@ def extract_flight_data(driver):
 
         # Extract from URL (format: f=ORIGIN, t=DESTINATION, d=DATE)
         if 'f=' in current_url:
-            origin = re.search(r'f=([A-Z]{3})', current_url)
+            origin = _RE_ORIGIN.search(current_url)
             origin = origin.group(1) if origin else 'UNKNOWN'
 
         if 't=' in current_url:
-            destination = re.search(r't=([A-Z]{3})', current_url)
+            destination = _RE_DEST.search(current_url)
             destination = destination.group(1) if destination else 'UNKNOWN'
 
         if 'd=' in current_url:
-            date = re.search(r'd=(\d{4}-\d{2}-\d{2})', current_url)
+            date = _RE_DATE.search(current_url)
             date = date.group(1) if date else 'UNKNOWN'
 
         print(f"📍 Route: {origin} → {destination}")
         print(f"📅 Date: {date}")
 
-        # Wait a bit for all flights to load
-        time.sleep(3)
-
         flights_found = 0
         min_miles = None
 
         # Check for error message from United
-        error_messages = driver.find_elements(By.XPATH, "//*[contains(text(), 'unable to complete your request') or contains(text(), 'Please try again later')]")
-        if error_messages:
+        if page['blocked']:
             print("❌ ERROR: United.com blocked the request")
             return {
                 'origin': origin,
@@ -57,25 +146,14 @@ def extract_flight_data(driver):
 
         # Look for flight cards/results
         print("🔎 Scanning for flight results...")
-        flight_elements = driver.find_elements(By.CSS_SELECTOR, "[class*='flight-result'], [class*='FlightResult'], [data-qa*='flight']")
-
-        if not flight_elements:
-            flight_elements = driver.find_elements(By.CSS_SELECTOR, "[class*='flightCard'], [class*='flight-card']")
-
-        if not flight_elements:
-            flight_elements = driver.find_elements(By.CSS_SELECTOR, "li[class*='flight'], div[class*='flight']")
-
-        flights_found = len(flight_elements)
+        flights_found = page['flights_found']
         print(f"✈️  Found {flights_found} flight elements")
 
         # Extract miles pricing
-        miles_elements = driver.find_elements(By.CSS_SELECTOR, "[class*='miles'], [class*='award-price'], [data-qa*='price']")
-
         miles_prices = []
-        for elem in miles_elements:
-            text = elem.text.strip()
+        for text in page['miles_texts']:
             # Extract numeric values from text like "12,500 miles" or "12500"
-            numbers = ''.join(filter(lambda x: x.isdigit(), text))
+            numbers = _RE_NON_DIGITS.sub('', text)
             if numbers:
                 miles_prices.append(int(numbers))
 
@@ -86,8 +164,7 @@ def extract_flight_data(driver):
             print("⚠️  No mile pricing found")
 
         # Check for "no flights" messages
-        no_flights_indicators = driver.find_elements(By.XPATH, "//*[contains(text(), 'No flights') or contains(text(), 'no flights') or contains(text(), 'not available')]")
-        if no_flights_indicators and flights_found == 0:
+        if page['no_flights'] and flights_found == 0:
             flights_found = 0
             min_miles = None
             print("ℹ️  No flights available for this route/date")
@@ -107,57 +184,100 @@ def extract_flight_data(driver):
         print(f"❌ Error extracting flight data: {e}")
         return None
 
-def save_to_csv(flight_data, filename='united_awards.csv'):
-    """Save flight data to CSV file"""
-    try:
-        # Check if file exists to determine if we need to write headers
+CSV_FIELDNAMES = ['origin', 'destination', 'date', 'flights_found', 'min_miles', 'scraped_at']
+
+class CsvSink:
+    """Append-only CSV writer that keeps one file handle open"""
+
+    def __init__(self, filename='united_awards.csv'):
+        self.filename = filename
+
+        # Only write headers when starting a new (or empty) file
         try:
-            with open(filename, 'r') as f:
-                write_header = False
+            write_header = os.stat(filename).st_size == 0
         except FileNotFoundError:
             write_header = True
 
-        # Append to CSV
-        with open(filename, 'a', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['origin', 'destination', 'date', 'flights_found', 'min_miles', 'scraped_at']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        self.csvfile = open(filename, 'a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.csvfile, fieldnames=CSV_FIELDNAMES)
+
+        if write_header:
+            self.writer.writeheader()
 
-            if write_header:
-                writer.writeheader()
+        atexit.register(self.close)
 
-            writer.writerow(flight_data)
+    def write(self, flight_data):
+        """Save flight data to the CSV file"""
+        try:
+            self.writer.writerow(flight_data)
+            # Rows arrive minutes apart, so push each one to disk right away
+            self.csvfile.flush()
+            print(f"✅ Data saved to {self.filename}")
+            return True
 
-        print(f"✅ Data saved to {filename}")
-        return True
+        except Exception as e:
+            print(f"❌ Error saving to CSV: {e}")
+            return False
 
-    except Exception as e:
-        print(f"❌ Error saving to CSV: {e}")
-        return False
+    def close(self):
+        """Close the file"""
+        if not self.csvfile.closed:
+            self.csvfile.close()
+
+CHROME_PROFILE_DIR = os.path.abspath('chrome_profile')
+
+# Photos and trackers the scraper never reads. SVGs and web fonts stay
+# allowed because United's icon buttons need them. Patterns match the full
+# URL, so the trailing * also catches CDN query strings (hero.jpg?w=1200).
+BLOCKED_URLS = [
+    '*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*',
+    '*google-analytics*', '*googletagmanager*', '*doubleclick*',
+]
 
 def setup_driver():
     """Configure Chrome to avoid bot detection"""
     options = uc.ChromeOptions()
     options.add_argument('--start-maximized')
-    driver = uc.Chrome(options=options, version_main=None)
+    # A persistent profile keeps the United login and HTTP cache between runs
+    driver = uc.Chrome(options=options, version_main=None, user_data_dir=CHROME_PROFILE_DIR)
     return driver
 
-def wait_for_search_results(driver, timeout=60):
-    """Wait for user to perform a search and results to load"""
+def block_heavy_assets(driver):
+    """Stop loading images and trackers for the rest of this session"""
+    # Only called after login so image challenges on the login page still work
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URLS})
+
+def wait_for_search_results(driver, last_scraped_url=None, timeout=60):
+    """Wait for user to perform a new search; returns the results URL, or None on timeout"""
     print("\n⏳ Waiting for you to search for flights on United.com...")
     print("   (The script will auto-detect when results appear)")
 
     start_time = time.time()
     last_url = driver.current_url
 
+    # United's SPA keeps the previous results on screen while a new search
+    # loads, so remember a card from them to tell old results from new ones
+    previous_card = driver.execute_script(JS_FIRST_FLIGHT_CARD, FLIGHT_SELECTORS) if last_scraped_url else None
+
     while time.time() - start_time < timeout:
         current_url = driver.current_url
 
-        # Check if URL changed to a flight search results page
-        if 'choose-flights' in current_url or 'fsr' in current_url:
+        # Once the user leaves the last scraped page, the same search may be run again
+        if current_url != last_scraped_url:
+            last_scraped_url = None
+
+        # Check if URL changed to a flight search results page we haven't scraped yet
+        if ('choose-flights' in current_url or 'fsr' in current_url) and current_url != last_scraped_url:
             print("\n✅ Flight results page detected!")
-            # Wait a bit more for results to fully load
-            time.sleep(5)
-            return True
+
+            if previous_card is not None:
+                try:
+                    WebDriverWait(driver, 15).until(EC.staleness_of(previous_card))
+                except TimeoutException:
+                    print("⚠️  Previous results still on screen, reading the page anyway")
+
+            return current_url
 
         # Check if URL changed at all (user is navigating)
         if current_url != last_url:
@@ -166,7 +286,7 @@ def wait_for_search_results(driver, timeout=60):
 
         time.sleep(1)
 
-    return False
+    return None
 
 def main():
     """Main function"""
@@ -187,8 +307,11 @@ def main():
     # Initialize Chrome
     print("\n🚀 Opening Chrome...")
     driver = setup_driver()
+    sink = None
 
     try:
+        sink = CsvSink()
+
         # Navigate to United homepage
         print("🌐 Loading United.com...")
         driver.get("https://www.united.com")
@@ -196,8 +319,13 @@ def main():
         print("\n" + "="*70)
         print("✋ PLEASE LOG IN TO YOUR UNITED ACCOUNT NOW")
         print("="*70)
+        print("   (Already logged in from a previous run? Just press ENTER)")
         input("\nPress ENTER after you've logged in...")
 
+        block_heavy_assets(driver)
+
+        last_scraped_url = None
+
         # Continuous monitoring loop
         while True:
             print("\n" + "="*70)
@@ -208,7 +336,8 @@ def main():
             print("="*70 + "\n")
 
             # Wait for user to search
-            if wait_for_search_results(driver, timeout=300):  # 5 minute timeout
+            results_url = wait_for_search_results(driver, last_scraped_url, timeout=300)  # 5 minute timeout
+            if results_url:
                 # Extract flight data
                 flight_data = extract_flight_data(driver)
 
@@ -222,7 +351,11 @@ def main():
                     print("="*70)
 
                     # Save to CSV
-                    save_to_csv(flight_data)
+                    sink.write(flight_data)
+
+                    # Blocked searches stay eligible so the user can retry them
+                    if flight_data['flights_found'] != 'BLOCKED':
+                        last_scraped_url = results_url
 
                     print("\n✨ Ready for next search!")
                     print("   You can:")
@@ -240,6 +373,8 @@ def main():
         print(f"\n❌ Unexpected error: {e}")
 
     finally:
+        if sink:
+            sink.close()
         driver.quit()
         print("✅ Chrome closed. Goodbye!")
 